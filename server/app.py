@@ -7,30 +7,168 @@ easily customizable for different stores.
 """
 
 import os
+import re
+import atexit
+import queue
 import json
-import uuid
+import base64
+import time
+import hashlib
 import datetime
-from flask import Flask, request, jsonify, send_from_directory
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from flask import Flask, request, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from flask_caching import Cache
+from flask_compress import Compress
 import firebase_admin
 from firebase_admin import credentials, auth, db
-from functools import wraps
+from cachetools import TTLCache
+from collections import defaultdict, namedtuple
+from functools import lru_cache, wraps
+from itertools import starmap
+from operator import mul
 import logging
-
-# Configure logging for production monitoring
-logging.basicConfig(
-    level=logging.INFO, 
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('velvetpos.log'),
-        logging.StreamHandler()
-    ]
-)
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+
+# Configure logging for production monitoring. Records are handed to a
+# background listener thread so request threads never wait on file I/O.
+_log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+_log_handlers = [
+    # Every gunicorn worker appends to the same file, so rotation is left to an external
+    # logrotate; the watched handler reopens the file once it has been moved
+    WatchedFileHandler('velvetpos.log'),
+    logging.StreamHandler()
+]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+
+_log_queue = queue.Queue(-1)
+_log_listener = QueueListener(_log_queue, *_log_handlers, respect_handler_level=True)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+# The queue handler only merges args into the message; the listener's handlers do the formatting
+_queue_handler = QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
 logger = logging.getLogger(__name__)
 
+def json_response(body, status=200):
+    """Response for an already-encoded JSON body"""
+    return app.response_class(body, status=status, mimetype='application/json')
+
+
+def ojson(obj, status=200):
+    """JSON response encoded with orjson rather than the stdlib encoder"""
+    return json_response(orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS), status)
+
+
+def _short_id():
+    """Random 16-character lowercase id with 80 bits of entropy, safe in Firebase keys"""
+    return base64.b32encode(os.urandom(10)).decode('ascii').lower()
+
+
+Timestamp = namedtuple('Timestamp', 'iso date time compact')
+
+
+@lru_cache(maxsize=1)
+def _timestamp_for(second):
+    """Every string form of a wall-clock second the API stores"""
+    moment = datetime.datetime.fromtimestamp(second)
+    return Timestamp(
+        iso=moment.isoformat(timespec='seconds'),
+        date=moment.strftime('%Y-%m-%d'),
+        time=moment.strftime('%H:%M:%S'),
+        compact=moment.strftime('%Y%m%d_%H%M%S')
+    )
+
+
+def _now():
+    """Current local time, formatted once per second and shared between requests"""
+    return _timestamp_for(int(time.time()))
+
+
+# Concurrent connections per gevent worker; keep in step with gunicorn's --worker-connections
+WORKER_CONNECTIONS = int(os.environ.get('WORKER_CONNECTIONS', 1000))
+
+
+def _io_pool_size():
+    """Pool size for Firebase fan-out
+    
+    Under gunicorn's gevent worker the pool's threads are patched into
+    greenlets, so it is sized to the worker's connection limit; otherwise
+    every in-flight sale would queue behind 16 real threads.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return 16
+    return WORKER_CONNECTIONS if monkey.is_module_patched('threading') else 16
+
+
+# Shared pool for overlapping independent Firebase round trips within a request
+_io_pool = ThreadPoolExecutor(max_workers=_io_pool_size(), thread_name_prefix='firebase-io')
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that parses request bodies with orjson, straight from bytes"""
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
+# Reject oversized request bodies before they are read into memory
+app.config['MAX_CONTENT_LENGTH'] = 1024 * 1024
+
+# Compress JSON and static text responses; brotli level 4 is about gzip's speed at a better ratio
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'text/html', 'text/css', 'application/javascript']
+app.config['COMPRESS_MIN_SIZE'] = 500
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_BR_LEVEL'] = 4
+Compress(app)
+
+# Response cache shared by all workers when Redis is available
+REDIS_URL = os.environ.get('REDIS_URL')
+cache = Cache(app, config={
+    'CACHE_TYPE': 'RedisCache' if REDIS_URL else 'SimpleCache',
+    'CACHE_REDIS_URL': REDIS_URL,
+    'CACHE_KEY_PREFIX': 'velvetpos:',
+    'CACHE_DEFAULT_TIMEOUT': 60
+})
+
+
+def _cache_get(key):
+    """Read from the shared cache, treating a backend failure as a miss"""
+    try:
+        return cache.get(key)
+    except Exception as e:
+        logger.warning("Cache read failed for %s: %s", key, e)
+        return None
+
+
+def _cache_set(key, value, timeout):
+    """Write to the shared cache, skipping the write if the backend fails"""
+    try:
+        cache.set(key, value, timeout=timeout)
+    except Exception as e:
+        logger.warning("Cache write failed for %s: %s", key, e)
+
+
+def _cache_delete(*keys):
+    """Drop keys from the shared cache, logging rather than raising if the backend fails"""
+    try:
+        cache.delete_many(*keys)
+    except Exception as e:
+        logger.warning("Cache delete failed for %s: %s", ', '.join(keys), e)
+
 # Environment configuration
 ENV = os.environ.get('ENVIRONMENT', 'development')
 DEBUG_MODE = ENV == 'development'
@@ -79,58 +217,275 @@ try:
     else:
         logger.warning("Firebase credentials not found. Running in demo mode.")
 except Exception as e:
-    logger.error(f"Firebase initialization error: {e}")
+    logger.error("Firebase initialization error: %s", e)
 
 
-def require_store_access(f):
-    """Decorator to enforce authentication and store access control"""
+def _warm_up_token_verifier():
+    """Verify a throwaway ID token so Google's public keys are fetched at boot"""
+    api_key = os.environ.get('FIREBASE_WEB_API_KEY')
+    if not api_key:
+        logger.info("FIREBASE_WEB_API_KEY not set, skipping token verifier warm-up")
+        return
+    
+    try:
+        custom_token = auth.create_custom_token('velvetpos-warmup')
+        response = requests.post(
+            'https://identitytoolkit.googleapis.com/v1/accounts:signInWithCustomToken',
+            params={'key': api_key},
+            json={'token': custom_token.decode(), 'returnSecureToken': True},
+            timeout=10
+        )
+        response.raise_for_status()
+        auth.verify_id_token(response.json()['idToken'])
+        logger.info("Token verifier warmed up")
+    except Exception as e:
+        logger.warning("Token verifier warm-up failed: %s", e)
+
+
+def _widen_firebase_connection_pool(pool_size=64):
+    """Let many concurrent requests share the RTDB client without pool starvation
+    
+    The SDK mounts requests' default adapters (10 connections per host). Under
+    gevent workers hundreds of greenlets talk to Firebase at once, so most of
+    them would open and throw away a fresh TLS connection per call.
+    """
+    try:
+        session = db.reference()._client.session
+        for prefix, adapter in list(session.adapters.items()):
+            session.mount(prefix, HTTPAdapter(
+                pool_connections=16,
+                pool_maxsize=pool_size,
+                max_retries=adapter.max_retries
+            ))
+    except Exception as e:
+        logger.warning("Could not resize Firebase connection pool: %s", e)
+
+
+if firebase_initialized:
+    _widen_firebase_connection_pool()
+
+# Move the one-time public key download off the first authenticated request
+if firebase_initialized:
+    threading.Thread(target=_warm_up_token_verifier, name='token-warmup', daemon=True).start()
+
+
+# Verified ID tokens, keyed by a digest of the raw token. Entries hold
+# (decoded_token, user_data, exp_ts) so repeat requests with the same token
+# skip both signature verification and the store user lookup. With Redis
+# configured, entries are also shared so each token is verified once per
+# deployment rather than once per worker.
+TOKEN_CACHE_TTL = 300
+_token_cache = TTLCache(maxsize=10_000, ttl=TOKEN_CACHE_TTL)
+_token_cache_lock = threading.Lock()
+
+# How long a worker waits for another worker that is already verifying the same token
+SHARED_TOKEN_WAIT = 1.0
+
+
+def _token_cache_key(id_token):
+    """Hash the raw ID token so full tokens are never kept in memory"""
+    return hashlib.blake2b(id_token.encode(), digest_size=16).hexdigest()
+
+
+def _cached_token_entry(cache_key):
+    """Token entry from the process cache, then the cache shared by all workers"""
+    with _token_cache_lock:
+        entry = _token_cache.get(cache_key)
+    if entry is None and REDIS_URL:
+        try:
+            entry = cache.get(f'tok:{cache_key}')
+        except Exception as e:
+            logger.warning("Shared token cache read failed: %s", e)
+        if entry is not None:
+            with _token_cache_lock:
+                _token_cache[cache_key] = entry
+    if entry and entry[2] > time.time():
+        return entry
+    return None
+
+
+def _store_token_entry(cache_key, entry):
+    """Remember a verified token and its store user in both cache layers"""
+    with _token_cache_lock:
+        _token_cache[cache_key] = entry
+    if REDIS_URL:
+        try:
+            cache.set(f'tok:{cache_key}', entry, timeout=max(1, int(entry[2] - time.time())))
+        except Exception as e:
+            logger.warning("Shared token cache write failed: %s", e)
+
+
+def _await_shared_token_entry(cache_key):
+    """Wait for another worker that is already verifying this token
+    
+    Returns its entry, or None once this worker holds the verification lock
+    (or gave up waiting, or the shared cache is down) and should verify the
+    token itself.
+    """
+    if not REDIS_URL:
+        return None
+    try:
+        if cache.add(f'tok:{cache_key}:lock', 1, timeout=5):
+            return None
+    except Exception as e:
+        logger.warning("Shared token lock unavailable: %s", e)
+        return None
+    deadline = time.time() + SHARED_TOKEN_WAIT
+    while time.time() < deadline:
+        time.sleep(0.05)
+        entry = _cached_token_entry(cache_key)
+        if entry:
+            return entry
+    return None
+
+
+def _release_token_lock(cache_key):
+    """Let other workers verify this token again"""
+    if REDIS_URL:
+        try:
+            cache.delete(f'tok:{cache_key}:lock')
+        except Exception as e:
+            logger.warning("Shared token lock release failed: %s", e)
+
+
+# Store ids become Realtime Database path segments, so anything outside this
+# set (slashes, '.', '#', '$', '[', ']') is rejected before a path is built
+_STORE_ID_RE = re.compile(r'\A[A-Za-z0-9_-]{1,64}\Z')
+
+
+def _set_request_user(decoded_token, user_data):
+    request.user_id = decoded_token.get('uid')
+    request.user_email = decoded_token.get('email', '')
+    request.user_role = decoded_token.get('role', 'staff')
+    request.store_id = decoded_token.get('store_id', 'default')
+    request.user_data = user_data
+
+
+@lru_cache(maxsize=1024)
+def _ref(store_id, node=None):
+    """Reference to a store, or one of its top-level nodes, built once per process"""
+    return db.reference(f'stores/{store_id}/{node}' if node else f'stores/{store_id}')
+
+
+def store_ref(path=None):
+    """Reference to the current request's store node, or a path beneath it
+    
+    Store and top-level node references are memoized by _ref(); deeper paths
+    such as a single product are a cheap child() of the cached node.
+    """
+    if not path:
+        return _ref(request.store_id)
+    node, _, rest = path.partition('/')
+    ref = _ref(request.store_id, node)
+    return ref.child(rest) if rest else ref
+
+
+def require_token(f):
+    """Decorator to verify the Firebase ID token and expose its claims on the request
+    
+    Only the token is checked here. Routes must also apply require_store_user
+    (directly, or through require_store_access) to confirm the user belongs to
+    the store; checks that only need the claims, like require_admin, can run
+    in between and skip that database read.
+    """
     @wraps(f)
     def decorated_function(*args, **kwargs):
         # Verify Firebase ID token
-        auth_header = request.headers.get('Authorization', '')
-        id_token = auth_header.replace('Bearer ', '')
+        auth_header = request.headers.get('Authorization')
+        id_token = auth_header[7:] if auth_header and auth_header.startswith('Bearer ') else ''
         
         if not id_token:
-            return jsonify({'error': 'No authentication token provided', 'code': 'AUTH_REQUIRED'}), 401
+            return ojson({'error': 'No authentication token provided', 'code': 'AUTH_REQUIRED'}), 401
+        
+        cache_key = _token_cache_key(id_token)
+        request.pending_token = None
         
         try:
-            decoded_token = auth.verify_id_token(id_token)
-            request.user_id = decoded_token.get('uid')
-            request.user_email = decoded_token.get('email', '')
-            request.user_role = decoded_token.get('role', 'staff')
-            request.store_id = decoded_token.get('store_id', 'default')
+            entry = _cached_token_entry(cache_key) or _await_shared_token_entry(cache_key)
+            if entry:
+                decoded_token, user_data, _ = entry
+            else:
+                decoded_token = auth.verify_id_token(id_token)
+                user_data = None
+                # Never serve a cached entry past the token's own expiry
+                exp_ts = min(decoded_token.get('exp', 0), time.time() + TOKEN_CACHE_TTL)
+                if firebase_initialized:
+                    request.pending_token = (cache_key, decoded_token, exp_ts)
+                else:
+                    # Demo mode has no store user to load, so the entry is complete
+                    _store_token_entry(cache_key, (decoded_token, None, exp_ts))
+                    _release_token_lock(cache_key)
             
-            # Verify user exists in store database
-            if not firebase_initialized:
-                # Demo mode - allow all
-                return f(*args, **kwargs)
-                
-            ref = db.reference(f'stores/{request.store_id}/users/{request.user_id}')
-            user_data = ref.get()
-            
-            if not user_data:
-                return jsonify({
-                    'error': 'User not found in store database',
-                    'code': 'USER_NOT_FOUND'
-                }), 401
+            _set_request_user(decoded_token, user_data)
                 
         except auth.InvalidIdTokenError:
-            logger.warning(f"Invalid token attempt from {request.remote_addr}")
-            return jsonify({'error': 'Invalid authentication token', 'code': 'INVALID_TOKEN'}), 401
+            _release_token_lock(cache_key)
+            logger.warning("Invalid token attempt from %s", request.remote_addr)
+            return ojson({'error': 'Invalid authentication token', 'code': 'INVALID_TOKEN'}), 401
         except Exception as e:
-            logger.error(f"Token verification failed: {e}")
-            return jsonify({'error': 'Authentication verification failed', 'code': 'AUTH_ERROR'}), 401
+            _release_token_lock(cache_key)
+            logger.error("Token verification failed: %s", e)
+            return ojson({'error': 'Authentication verification failed', 'code': 'AUTH_ERROR'}), 401
+        
+        if not isinstance(request.store_id, str) or not _STORE_ID_RE.match(request.store_id):
+            _release_token_lock(cache_key)
+            logger.warning("Rejected invalid store id for user %s", request.user_id)
+            return ojson({'error': 'Invalid store id', 'code': 'INVALID_STORE_ID'}), 400
+        
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def require_store_user(f):
+    """Decorator to confirm the verified user exists in their store's database
+    
+    Must run after require_token. Skips the read when the token cache
+    already holds the user record.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if request.pending_token:
+            cache_key, decoded_token, exp_ts = request.pending_token
+            try:
+                ref = store_ref(f'users/{request.user_id}')
+                user_data = ref.get()
+                
+                if not user_data:
+                    return ojson({
+                        'error': 'User not found in store database',
+                        'code': 'USER_NOT_FOUND'
+                    }), 401
+                
+                _store_token_entry(cache_key, (decoded_token, user_data, exp_ts))
+                request.user_data = user_data
+                request.pending_token = None
+            except Exception as e:
+                logger.error("Token verification failed: %s", e)
+                return ojson({'error': 'Authentication verification failed', 'code': 'AUTH_ERROR'}), 401
+            finally:
+                _release_token_lock(cache_key)
         
         return f(*args, **kwargs)
     return decorated_function
 
 
+def require_store_access(f):
+    """Decorator to enforce authentication and store access control"""
+    return require_token(require_store_user(f))
+
+
+_ADMIN_ROLES = frozenset(('admin', 'owner', 'manager'))
+
+
 def require_admin(f):
     """Decorator to require admin/owner role"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if request.user_role not in ['admin', 'owner', 'manager']:
-            return jsonify({
+        if request.user_role not in _ADMIN_ROLES:
+            if request.pending_token:
+                # Nothing gets cached for this token here, so let its next request verify straight away
+                _release_token_lock(request.pending_token[0])
+            return ojson({
                 'error': 'Insufficient permissions',
                 'code': 'INSUFFICIENT_PERMISSIONS'
             }), 403
@@ -138,6 +493,46 @@ def require_admin(f):
     return decorated_function
 
 
+STORE_RESPONSE_CACHE_TTL = 300
+# Revalidated on every load, so a config change (e.g. tax_rate) shows up straight away
+STORE_RESPONSE_CACHE_CONTROL = 'private, no-cache'
+
+
+def cached_store_response(prefix):
+    """Decorator to memoize a store-scoped GET response and serve it with an ETag
+    
+    With Redis configured, the encoded body is kept in the shared cache under
+    '<prefix>:<store_id>' until it expires or a write drops it with
+    _cache_delete(). Without it every request reads through, since a
+    per-process cache can't be invalidated from the worker that took the
+    write. Either way, clients that already hold the current version get a 304.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            cache_key = f'{prefix}:{request.store_id}'
+            cached = _cache_get(cache_key) if REDIS_URL else None
+            
+            if cached is None:
+                response = f(*args, **kwargs)
+                if isinstance(response, tuple):
+                    # Errors are returned with a status code and never cached
+                    return response
+                body = response.get_data()
+                cached = (hashlib.blake2b(body, digest_size=16).hexdigest(), body)
+                if REDIS_URL:
+                    _cache_set(cache_key, cached, STORE_RESPONSE_CACHE_TTL)
+            
+            etag, body = cached
+            response = json_response(body)
+            # Weak, so compression leaves it alone and revalidation stays a cheap 304
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = STORE_RESPONSE_CACHE_CONTROL
+            return response.make_conditional(request)
+        return decorated_function
+    return decorator
+
+
 # ==================== ROUTES ====================
 
 @app.route('/')
@@ -161,7 +556,7 @@ def login_page():
 @app.route('/api/health')
 def health_check():
     """Health check endpoint for monitoring"""
-    return jsonify({
+    return ojson({
         'status': 'healthy',
         'service': 'velvet-pos-api',
         'version': '1.0.0',
@@ -172,6 +567,10 @@ def health_check():
 
 # ==================== AUTHENTICATION ====================
 
+# Upper bound on waiting for the speculative store config read in verify_auth
+AUTH_READ_TIMEOUT = 2.5
+
+
 @app.route('/api/auth/verify', methods=['POST'])
 def verify_auth():
     """Verify user authentication and return store info"""
@@ -179,15 +578,20 @@ def verify_auth():
     id_token = data.get('idToken')
     
     if not id_token:
-        return jsonify({'error': 'No token provided', 'code': 'MISSING_TOKEN'}), 400
+        return ojson({'error': 'No token provided', 'code': 'MISSING_TOKEN'}), 400
     
+    config_future = None
     try:
+        # The store config doesn't depend on the user, so fetch it while the token is verified
+        if firebase_initialized:
+            config_future = _io_pool.submit(_ref('default', 'config').get)
+        
         decoded_token = auth.verify_id_token(id_token)
         user_id = decoded_token.get('uid')
         
         if not firebase_initialized:
             # Demo mode
-            return jsonify({
+            return ojson({
                 'user': {
                     'uid': user_id,
                     'email': decoded_token.get('email'),
@@ -195,43 +599,46 @@ def verify_auth():
                     'role': 'owner',
                     'store_id': 'default'
                 },
-                'store_config': {
-                    'name': 'Velvet Beauty Boutique',
-                    'currency': 'USD',
-                    'currency_symbol': '$',
-                    'tax_rate': 0.08,
-                    'theme_color': '#D4AF37',
-                    'demo_mode': True
-                }
+                'store_config': {**DEMO_STORE_CONFIG, 'demo_mode': True}
             })
         
         # Get user data from Realtime Database
-        ref = db.reference(f'stores/default/users/{user_id}')
+        ref = _ref('default', 'users').child(user_id)
         user_data = ref.get()
         
         if not user_data:
-            return jsonify({
+            return ojson({
                 'error': 'User not found in store database',
                 'code': 'USER_NOT_FOUND',
                 'needs_setup': True
             }), 404
         
-        # Get store config
-        config_ref = db.reference(f'stores/default/config')
-        store_config = config_ref.get() or {}
+        # Get store config; a slow read shouldn't fail an otherwise valid login
+        try:
+            store_config = config_future.result(timeout=AUTH_READ_TIMEOUT) or {}
+        except FuturesTimeoutError:
+            logger.warning("Store config read timed out during login for %s", user_id)
+            store_config = {}
         
-        return jsonify({
+        return ojson({
             'user': user_data,
             'store_config': store_config
         })
     except Exception as e:
-        logger.error(f"Auth verification error: {e}")
-        return jsonify({'error': str(e), 'code': 'VERIFICATION_FAILED'}), 401
+        if config_future:
+            config_future.cancel()
+        logger.error("Auth verification error: %s", e)
+        return ojson({'error': str(e), 'code': 'VERIFICATION_FAILED'}), 401
+
+
+# Upper bound on waiting for each of create_user's follow-up writes
+USER_SETUP_TIMEOUT = 5
 
 
 @app.route('/api/auth/create-user', methods=['POST'])
-@require_store_access
+@require_token
 @require_admin
+@require_store_user
 def create_user():
     """Create a new staff user (Admin only)"""
     data = request.get_json()
@@ -241,7 +648,7 @@ def create_user():
     name = data.get('name')
     
     if not all([email, password, name]):
-        return jsonify({'error': 'Missing required fields', 'code': 'MISSING_FIELDS'}), 400
+        return ojson({'error': 'Missing required fields', 'code': 'MISSING_FIELDS'}), 400
     
     try:
         # Create user in Firebase Auth
@@ -251,51 +658,140 @@ def create_user():
             display_name=name
         )
         
-        # Set custom claims
-        auth.set_custom_user_claims(user_record.uid, {
+        # Custom claims and the Realtime DB record only need the uid, so write both at once
+        claims_future = _io_pool.submit(auth.set_custom_user_claims, user_record.uid, {
             'role': role,
             'store_id': request.store_id
         })
-        
-        # Store user data in Realtime DB
-        user_ref = db.reference(f'stores/{request.store_id}/users/{user_record.uid}')
-        user_ref.set({
+        user_ref = store_ref(f'users/{user_record.uid}')
+        record_future = _io_pool.submit(user_ref.set, {
             'email': email,
             'name': name,
             'role': role,
-            'created_at': datetime.datetime.now().isoformat(),
+            'created_at': _now().iso,
             'created_by': request.user_id,
             'active': True
         })
+        claims_future.result(timeout=USER_SETUP_TIMEOUT)
+        record_future.result(timeout=USER_SETUP_TIMEOUT)
+        _invalidate_staff(request.store_id)
         
-        logger.info(f"Created user {user_record.uid} with role {role}")
-        return jsonify({
+        logger.info("Created user %s with role %s", user_record.uid, role)
+        return ojson({
             'success': True,
             'user_id': user_record.uid,
             'message': 'User created successfully'
         })
     except Exception as e:
-        logger.error(f"User creation error: {e}")
-        return jsonify({'error': str(e), 'code': 'CREATION_FAILED'}), 500
+        logger.error("User creation error: %s", e)
+        return ojson({'error': str(e), 'code': 'CREATION_FAILED'}), 500
 
 
 # ==================== INVENTORY ====================
 
+INVENTORY_CACHE_TTL = 60
+INVENTORY_PAGE_SIZE = 50
+# Longest ?cursor= or ?category= accepted, so query strings can't mint arbitrary cache keys
+INVENTORY_QUERY_MAX_LENGTH = 128
+
+
+def _inventory_generation(store_id):
+    """Current cache generation for a store's inventory pages; writes move it on"""
+    return _cache_get(f'inventory_gen:{store_id}') or 0
+
+
+def _invalidate_inventory(store_id):
+    """Retire every cached inventory page for a store by starting a new generation"""
+    try:
+        cache.cache.inc(f'inventory_gen:{store_id}')
+    except Exception as e:
+        logger.warning("Inventory cache invalidation failed for %s: %s", store_id, e)
+
+
 @app.route('/api/inventory', methods=['GET'])
 @require_store_access
 def get_inventory():
-    """Get all products in inventory"""
+    """Get products in inventory, optionally paged with ?cursor=&limit=
+    
+    ?category= returns only that category's products, unpaged.
+    ?sku= or ?barcode= instead returns just the matching product, for scanners.
+    """
     try:
+        sku = request.args.get('sku')
+        barcode = request.args.get('barcode')
+        if sku or barcode:
+            field, value = ('sku', sku) if sku else ('barcode', barcode)
+            if not firebase_initialized:
+                product_id = (SKU_INDEX if sku else BARCODE_INDEX).get(value)
+                matches = {product_id: DEMO_INVENTORY[product_id]} if product_id else {}
+            else:
+                ref = store_ref('inventory')
+                matches = ref.order_by_child(field).equal_to(value).get() or {}
+            return ojson({'inventory': matches})
+        
+        category = request.args.get('category')
+        cursor = request.args.get('cursor')
+        limit = request.args.get('limit', type=int)
+        paged = not category and (cursor is not None or limit is not None)
+        limit = max(1, min(limit or INVENTORY_PAGE_SIZE, 500))
+        if len(category or '') > INVENTORY_QUERY_MAX_LENGTH or len(cursor or '') > INVENTORY_QUERY_MAX_LENGTH:
+            return ojson({'error': 'Cursor or category too long', 'code': 'INVALID_QUERY'}), 400
+        
         if not firebase_initialized:
             # Return demo inventory
-            return jsonify({'inventory': DEMO_INVENTORY})
+            inventory = DEMO_INVENTORY
+            if category:
+                inventory = {pid: DEMO_INVENTORY[pid] for pid in get_products_by_category(category)}
+            next_cursor = None
+        else:
+            # Pages are only cached when every worker shares the cache: a per-process
+            # cache can't be invalidated from the worker that took the write, and
+            # stale stock would oversell. Each page has its own key and TTL under
+            # the store's current generation, which writes bump.
+            if category:
+                page_key = f'category:{category}'
+            else:
+                page_key = f'{cursor}:{limit}' if paged else 'all'
+            cache_key = None
+            page = None
+            if REDIS_URL:
+                cache_key = f'inventory:{request.store_id}:{_inventory_generation(request.store_id)}:{page_key}'
+                page = _cache_get(cache_key)
+            
+            if page is None:
+                ref = store_ref('inventory')
+                if category:
+                    page = (ref.order_by_child('category').equal_to(category).get() or {}, None)
+                elif paged:
+                    query = ref.order_by_key()
+                    if cursor:
+                        query = query.start_at(cursor)
+                    # Fetch one extra product to learn where the next page starts
+                    products = query.limit_to_first(limit + 1).get() or {}
+                    keys = list(products)
+                    page = (
+                        {k: products[k] for k in keys[:limit]},
+                        keys[limit] if len(keys) > limit else None
+                    )
+                else:
+                    page = (ref.get() or {}, None)
+                if cache_key:
+                    _cache_set(cache_key, page, INVENTORY_CACHE_TTL)
+            
+            inventory, next_cursor = page
         
-        ref = db.reference(f'stores/{request.store_id}/inventory')
-        inventory = ref.get()
-        return jsonify({'inventory': inventory or {}})
+        body = {'inventory': inventory}
+        if paged:
+            body['next_cursor'] = next_cursor
+        
+        response = ojson(body)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.add_etag(weak=True)
+        return response.make_conditional(request)
     except Exception as e:
-        logger.error(f"Inventory fetch error: {e}")
-        return jsonify({'error': str(e), 'code': 'FETCH_FAILED'}), 500
+        logger.error("Inventory fetch error: %s", e)
+        return ojson({'error': str(e), 'code': 'FETCH_FAILED'}), 500
 
 
 @app.route('/api/inventory/<product_id>', methods=['GET'])
@@ -306,40 +802,36 @@ def get_product(product_id):
         if not firebase_initialized:
             product = DEMO_INVENTORY.get(product_id)
             if not product:
-                return jsonify({'error': 'Product not found', 'code': 'NOT_FOUND'}), 404
-            return jsonify({'product': product})
+                return ojson({'error': 'Product not found', 'code': 'NOT_FOUND'}), 404
+            return ojson({'product': product})
         
-        ref = db.reference(f'stores/{request.store_id}/inventory/{product_id}')
+        ref = store_ref(f'inventory/{product_id}')
         product = ref.get()
         if not product:
-            return jsonify({'error': 'Product not found', 'code': 'NOT_FOUND'}), 404
-        return jsonify({'product': product})
+            return ojson({'error': 'Product not found', 'code': 'NOT_FOUND'}), 404
+        return ojson({'product': product})
     except Exception as e:
-        logger.error(f"Product fetch error: {e}")
-        return jsonify({'error': str(e), 'code': 'FETCH_FAILED'}), 500
+        logger.error("Product fetch error: %s", e)
+        return ojson({'error': str(e), 'code': 'FETCH_FAILED'}), 500
 
 
 @app.route('/api/inventory', methods=['POST'])
-@require_store_access
+@require_token
 @require_admin
+@require_store_user
 def add_product():
     """Add a new product (Admin only)"""
     data = request.get_json()
     required_fields = ['name', 'price', 'sku']
     
     if not all(field in data for field in required_fields):
-        return jsonify({
+        return ojson({
             'error': f'Missing required fields: {required_fields}',
             'code': 'MISSING_FIELDS'
         }), 400
     
     try:
-        product_id = data.get('id', str(uuid.uuid4()))
-        
-        if firebase_initialized:
-            product_ref = db.reference(f'stores/{request.store_id}/inventory/{product_id}')
-        else:
-            product_ref = type('Ref', (), {'set': lambda x: DEMO_INVENTORY.update({product_id: x})})()
+        product_id = data.get('id') or _short_id()
         
         product_data = {
             'id': product_id,
@@ -352,22 +844,28 @@ def add_product():
             'image_url': data.get('image_url', ''),
             'barcode': data.get('barcode', ''),
             'active': True,
-            'created_at': datetime.datetime.now().isoformat(),
+            'created_at': _now().iso,
             'created_by': request.user_id
         }
         
-        product_ref.set(product_data)
-        logger.info(f"Added product {product_id}: {data['name']}")
+        if firebase_initialized:
+            store_ref(f'inventory/{product_id}').set(product_data)
+            _invalidate_inventory(request.store_id)
+        else:
+            DEMO_INVENTORY[product_id] = product_data
+            _reindex_demo_inventory()
+        logger.info("Added product %s: %s", product_id, data['name'])
         
-        return jsonify({'success': True, 'product': product_data})
+        return ojson({'success': True, 'product': product_data})
     except Exception as e:
-        logger.error(f"Product creation error: {e}")
-        return jsonify({'error': str(e), 'code': 'CREATION_FAILED'}), 500
+        logger.error("Product creation error: %s", e)
+        return ojson({'error': str(e), 'code': 'CREATION_FAILED'}), 500
 
 
 @app.route('/api/inventory/<product_id>', methods=['PUT'])
-@require_store_access
+@require_token
 @require_admin
+@require_store_user
 def update_product(product_id):
     """Update a product (Admin only)"""
     data = request.get_json()
@@ -376,14 +874,15 @@ def update_product(product_id):
         if not firebase_initialized:
             existing = DEMO_INVENTORY.get(product_id)
             if not existing:
-                return jsonify({'error': 'Product not found', 'code': 'NOT_FOUND'}), 404
+                return ojson({'error': 'Product not found', 'code': 'NOT_FOUND'}), 404
             DEMO_INVENTORY[product_id] = {**existing, **data}
-            return jsonify({'success': True, 'product': DEMO_INVENTORY[product_id]})
+            _reindex_demo_inventory()
+            return ojson({'success': True, 'product': DEMO_INVENTORY[product_id]})
         
-        ref = db.reference(f'stores/{request.store_id}/inventory/{product_id}')
+        ref = store_ref(f'inventory/{product_id}')
         existing = ref.get()
         if not existing:
-            return jsonify({'error': 'Product not found', 'code': 'NOT_FOUND'}), 404
+            return ojson({'error': 'Product not found', 'code': 'NOT_FOUND'}), 404
         
         update_data = {
             'name': data.get('name', existing.get('name')),
@@ -393,46 +892,131 @@ def update_product(product_id):
             'stock': int(data.get('stock', existing.get('stock', 0))),
             'image_url': data.get('image_url', existing.get('image_url', '')),
             'active': data.get('active', existing.get('active', True)),
-            'updated_at': datetime.datetime.now().isoformat(),
+            'updated_at': _now().iso,
             'updated_by': request.user_id
         }
         
         ref.update(update_data)
-        logger.info(f"Updated product {product_id}")
+        _invalidate_inventory(request.store_id)
+        logger.info("Updated product %s", product_id)
         
-        return jsonify({'success': True, 'product': {**existing, **update_data}})
+        return ojson({'success': True, 'product': {**existing, **update_data}})
     except Exception as e:
-        logger.error(f"Product update error: {e}")
-        return jsonify({'error': str(e), 'code': 'UPDATE_FAILED'}), 500
+        logger.error("Product update error: %s", e)
+        return ojson({'error': str(e), 'code': 'UPDATE_FAILED'}), 500
 
 
 @app.route('/api/inventory/<product_id>', methods=['DELETE'])
-@require_store_access
+@require_token
 @require_admin
+@require_store_user
 def delete_product(product_id):
     """Delete a product (Admin only)"""
     try:
         if not firebase_initialized:
             if product_id not in DEMO_INVENTORY:
-                return jsonify({'error': 'Product not found', 'code': 'NOT_FOUND'}), 404
+                return ojson({'error': 'Product not found', 'code': 'NOT_FOUND'}), 404
             del DEMO_INVENTORY[product_id]
-            return jsonify({'success': True, 'message': 'Product deleted'})
+            _reindex_demo_inventory()
+            return ojson({'success': True, 'message': 'Product deleted'})
         
-        ref = db.reference(f'stores/{request.store_id}/inventory/{product_id}')
+        ref = store_ref(f'inventory/{product_id}')
         if not ref.get():
-            return jsonify({'error': 'Product not found', 'code': 'NOT_FOUND'}), 404
+            return ojson({'error': 'Product not found', 'code': 'NOT_FOUND'}), 404
         
         ref.delete()
-        logger.info(f"Deleted product {product_id}")
+        _invalidate_inventory(request.store_id)
+        logger.info("Deleted product %s", product_id)
         
-        return jsonify({'success': True, 'message': 'Product deleted'})
+        return ojson({'success': True, 'message': 'Product deleted'})
     except Exception as e:
-        logger.error(f"Product deletion error: {e}")
-        return jsonify({'error': str(e), 'code': 'DELETE_FAILED'}), 500
+        logger.error("Product deletion error: %s", e)
+        return ojson({'error': str(e), 'code': 'DELETE_FAILED'}), 500
 
 
 # ==================== TRANSACTIONS ====================
 
+class InsufficientStockError(Exception):
+    """Raised inside a stock transaction to abort it"""
+    
+    def __init__(self, product_id, available):
+        super().__init__(f'Insufficient stock for {product_id}')
+        self.product_id = product_id
+        self.available = available
+
+
+def _decrement_stock(stock_ref, product_id, quantity):
+    """Atomically take quantity off a product's stock, aborting if there isn't enough"""
+    def take(current):
+        current = current or 0
+        if current < quantity:
+            raise InsufficientStockError(product_id, current)
+        return current - quantity
+    return stock_ref.transaction(take)
+
+
+def _restock(stock_ref, quantity):
+    """Atomically give quantity back to a product's stock"""
+    return stock_ref.transaction(lambda current: (current or 0) + quantity)
+
+
+def _restock_all(store, quantities, product_ids):
+    """Give back the stock a sale took from these products, all at once"""
+    list(_io_pool.map(
+        lambda product_id: _restock(store.child(f'inventory/{product_id}/stock'), quantities[product_id]),
+        product_ids
+    ))
+
+
+def _valid_cart_item(item):
+    """Whether a cart line has a numeric price and a positive whole quantity"""
+    if not isinstance(item, dict):
+        return False
+    price = item.get('price')
+    quantity = item.get('quantity', 1)
+    return (
+        isinstance(price, (int, float)) and not isinstance(price, bool)
+        and isinstance(quantity, int) and not isinstance(quantity, bool) and quantity > 0
+    )
+
+
+def _increment(delta):
+    """Server-side increment, applied by Firebase without a read"""
+    return {'.sv': {'increment': delta}}
+
+
+def _tally_product_sales(transactions):
+    """Per-product quantity and revenue totals from a set of transactions"""
+    product_sales = {}
+    for tx in transactions.values():
+        for item in tx.get('items', []):
+            product_id = item.get('id')
+            if not product_id:
+                continue
+            quantity = item.get('quantity', 1)
+            
+            if product_id not in product_sales:
+                product_sales[product_id] = {
+                    'name': None,
+                    'quantity_sold': 0,
+                    'revenue': 0
+                }
+            
+            product_sales[product_id]['name'] = product_sales[product_id]['name'] or item.get('name')
+            product_sales[product_id]['quantity_sold'] += quantity
+            product_sales[product_id]['revenue'] += item.get('price', 0) * quantity
+    return product_sales
+
+
+# Bookkeeping fields kept on stored transactions but never returned to clients
+_INTERNAL_TRANSACTION_FIELDS = frozenset(('in_product_sales',))
+
+
+def _public_transaction(tx):
+    """A stored transaction without its internal bookkeeping fields"""
+    return {k: v for k, v in tx.items() if k not in _INTERNAL_TRANSACTION_FIELDS}
+
+
 @app.route('/api/transactions', methods=['GET'])
 @require_store_access
 def get_transactions():
@@ -441,15 +1025,15 @@ def get_transactions():
         limit = int(request.args.get('limit', 100))
         
         if not firebase_initialized:
-            return jsonify({'transactions': DEMO_TRANSACTIONS})
+            return json_response(DEMO_TRANSACTIONS_JSON)
         
-        ref = db.reference(f'stores/{request.store_id}/transactions')
-        transactions = ref.order_by_child('timestamp').limit_to_last(limit).get()
+        ref = store_ref('transactions')
+        transactions = ref.order_by_child('timestamp').limit_to_last(limit).get() or {}
         
-        return jsonify({'transactions': transactions or {}})
+        return ojson({'transactions': {k: _public_transaction(tx) for k, tx in transactions.items()}})
     except Exception as e:
-        logger.error(f"Transactions fetch error: {e}")
-        return jsonify({'error': str(e), 'code': 'FETCH_FAILED'}), 500
+        logger.error("Transactions fetch error: %s", e)
+        return ojson({'error': str(e), 'code': 'FETCH_FAILED'}), 500
 
 
 @app.route('/api/transactions', methods=['POST'])
@@ -460,63 +1044,84 @@ def create_transaction():
     items = data.get('items', [])
     
     if not items:
-        return jsonify({'error': 'No items in transaction', 'code': 'EMPTY_TRANSACTION'}), 400
+        return ojson({'error': 'No items in transaction', 'code': 'EMPTY_TRANSACTION'}), 400
+    
+    if not all(_valid_cart_item(item) for item in items):
+        return ojson({
+            'error': 'Each item needs a numeric price and a positive whole quantity',
+            'code': 'INVALID_ITEMS'
+        }), 400
     
     try:
-        transaction_id = f"tx_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{str(uuid.uuid4())[:8]}"
-        timestamp = datetime.datetime.now()
+        timestamp = _now()
+        transaction_id = f"tx_{timestamp.compact}_{_short_id()}"
+        date_key = timestamp.date
         
         # Calculate totals
-        subtotal = sum(item.get('price', 0) * item.get('quantity', 1) for item in items)
+        subtotal = sum(starmap(mul, ((item['price'], item.get('quantity', 1)) for item in items)))
         
-        # Get tax rate from config
-        tax_rate = 0.08  # Default
-        if firebase_initialized:
-            config_ref = db.reference(f'stores/{request.store_id}/config')
-            config = config_ref.get() or {}
-            tax_rate = float(config.get('tax_rate', 0.08))
+        # Total quantity per product, so repeated cart lines are checked together
+        quantities = {}
+        for item in items:
+            product_id = item.get('id')
+            quantities[product_id] = quantities.get(product_id, 0) + item.get('quantity', 1)
         
-        tax_amount = round(subtotal * tax_rate, 2)
-        total = subtotal + tax_amount
         discount = float(data.get('discount', 0))
-        total -= discount
         
-        # Validate stock and prepare updates
+        tax_rate = 0.08  # Default
         if firebase_initialized:
-            ref = db.reference(f'stores/{request.store_id}/inventory')
-            stock_updates = []
+            store = store_ref()
             
-            for item in items:
-                product_id = item.get('id')
-                quantity = item.get('quantity', 1)
-                
-                product_ref = ref.child(product_id)
-                current_stock = product_ref.child('stock').get() or 0
-                
-                if current_stock < quantity:
-                    return jsonify({
-                        'error': f'Insufficient stock for {item.get("name", product_id)}. Available: {current_stock}',
-                        'code': 'INSUFFICIENT_STOCK'
-                    }), 400
-                
-                stock_updates.append({
-                    'product_id': product_id,
-                    'quantity_change': -quantity,
-                    'current_stock': current_stock
-                })
+            # Decrement every product's stock in its own transaction, all at once,
+            # so concurrent sales can't oversell or overwrite each other
+            config_future = _io_pool.submit(store.child('config').get)
+            stock_futures = {
+                product_id: _io_pool.submit(
+                    _decrement_stock, store.child(f'inventory/{product_id}/stock'), product_id, quantity
+                )
+                for product_id, quantity in quantities.items()
+            }
+            
+            committed = []
+            failure = None
+            for product_id, future in stock_futures.items():
+                try:
+                    future.result()
+                    committed.append(product_id)
+                except Exception as e:
+                    failure = failure or e
+            
+            try:
+                config = config_future.result() or {}
+            except Exception as e:
+                failure = failure or e
+            
+            if failure:
+                # Put back what was already taken before reporting the failure
+                _restock_all(store, quantities, committed)
+                if not isinstance(failure, InsufficientStockError):
+                    raise failure
+                name = next((i.get('name') for i in items if i.get('id') == failure.product_id), None)
+                return ojson({
+                    'error': f'Insufficient stock for {name or failure.product_id}. Available: {failure.available}',
+                    'code': 'INSUFFICIENT_STOCK'
+                }), 400
             
-            # Apply stock updates atomically
-            for update in stock_updates:
-                product_ref = ref.child(update['product_id'])
-                new_stock = update['current_stock'] + update['quantity_change']
-                product_ref.update({'stock': new_stock})
+            # Cached pages now show stale stock levels
+            _invalidate_inventory(request.store_id)
+            
+            # Get tax rate from config
+            tax_rate = float(config.get('tax_rate', 0.08))
+        
+        tax_amount = round(subtotal * tax_rate, 2)
+        total = subtotal + tax_amount - discount
         
         # Create transaction record
         transaction_data = {
             'id': transaction_id,
-            'timestamp': timestamp.isoformat(),
-            'date': timestamp.strftime('%Y-%m-%d'),
-            'time': timestamp.strftime('%H:%M:%S'),
+            'timestamp': timestamp.iso,
+            'date': date_key,
+            'time': timestamp.time,
             'staff_id': request.user_id,
             'staff_name': data.get('staff_name', ''),
             'customer_id': data.get('customer_id', ''),
@@ -533,60 +1138,173 @@ def create_transaction():
         }
         
         if firebase_initialized:
-            transaction_ref = db.reference(f'stores/{request.store_id}/transactions/{transaction_id}')
-            transaction_ref.set(transaction_data)
+            # The record is the commit point. If it can't be written the stock goes back
+            # and the POS can safely retry; once it exists the sale stands.
+            # It is marked as counted by the running product totals below, so the
+            # one-time history backfill in get_top_products skips it.
+            try:
+                store.child(f'transactions/{transaction_id}').set({**transaction_data, 'in_product_sales': True})
+            except Exception:
+                _restock_all(store, quantities, committed)
+                _invalidate_inventory(request.store_id)
+                raise
             
             # Update daily summary
-            date_key = timestamp.strftime('%Y-%m-%d')
-            summary_ref = db.reference(f'stores/{request.store_id}/daily_summaries/{date_key}')
-            summary = summary_ref.get() or {}
+            def add_to_summary(summary):
+                summary = summary or {}
+                return {
+                    **summary,
+                    'transaction_count': summary.get('transaction_count', 0) + 1,
+                    'total_sales': round(summary.get('total_sales', 0) + total, 2),
+                    'date': date_key
+                }
             
-            new_sales_count = summary.get('transaction_count', 0) + 1
-            new_sales_total = summary.get('total_sales', 0) + total
+            # Keep running per-product totals so top-products never rescans history
+            sales_updates = {}
+            for product_id, sales in _tally_product_sales({transaction_id: transaction_data}).items():
+                if sales['name']:
+                    sales_updates[f'{product_id}/name'] = sales['name']
+                sales_updates[f'{product_id}/quantity_sold'] = _increment(sales['quantity_sold'])
+                sales_updates[f'{product_id}/revenue'] = _increment(sales['revenue'])
+            totals_futures = [_io_pool.submit(store.child(f'daily_summaries/{date_key}').transaction, add_to_summary)]
+            if sales_updates:
+                totals_futures.append(_io_pool.submit(store.child('aggregates/product_sales').update, sales_updates))
             
-            summary_ref.update({
-                'transaction_count': new_sales_count,
-                'total_sales': round(new_sales_total, 2),
-                'date': date_key
-            })
+            # The sale is already recorded, so a failed total is logged rather than undoing it
+            for future in totals_futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error("Transaction %s recorded but its running totals were not updated: %s", transaction_id, e)
         
-        logger.info(f"Created transaction {transaction_id} for ${total:.2f}")
+        logger.info("Created transaction %s for $%.2f", transaction_id, total)
         
-        return jsonify({
+        return ojson({
             'success': True,
             'transaction': transaction_data,
             'change_due': max(0, data.get('cash_amount', 0) - total)
         })
     except Exception as e:
-        logger.error(f"Transaction creation error: {e}")
-        return jsonify({'error': str(e), 'code': 'CREATION_FAILED'}), 500
+        logger.error("Transaction creation error: %s", e)
+        return ojson({'error': str(e), 'code': 'CREATION_FAILED'}), 500
 
 
 # ==================== CUSTOMERS ====================
 
+CUSTOMER_SEARCH_LIMIT = 50
+
+
+def _customer_search_fields(customer):
+    """Lowercased name and reversed phone, stored so searches can use prefix indexes"""
+    return {
+        'name_lower': customer.get('name', '').lower(),
+        'phone_reversed': str(customer.get('phone', ''))[::-1]
+    }
+
+
+def _filter_customers(customers, search):
+    """Customers whose name starts with, or whose phone starts or ends with, search
+    
+    The same rule the indexed queries apply, for when they aren't available.
+    """
+    return {
+        k: v for k, v in customers.items()
+        if v.get('name', '').lower().startswith(search)
+        or str(v.get('phone', '')).startswith(search)
+        or str(v.get('phone', '')).endswith(search)
+    }
+
+
+class CustomerSearchAlreadyBackfilled(Exception):
+    """Raised inside the backfill-flag transaction when another request already claimed it"""
+
+
+# Stores whose customers are known to carry the search fields, so the flag is read once per process
+_customer_search_backfilled = set()
+
+
+def _backfill_customer_search_fields(store_id):
+    """Give customers saved before the search fields existed their name_lower and phone_reversed, once per store"""
+    if store_id in _customer_search_backfilled:
+        return
+    flag_ref = store_ref('migrations/customer_search_fields')
+    
+    def claim(current):
+        if current:
+            raise CustomerSearchAlreadyBackfilled()
+        return _now().iso
+    
+    try:
+        flag_ref.transaction(claim)
+    except CustomerSearchAlreadyBackfilled:
+        _customer_search_backfilled.add(store_id)
+        return
+    
+    try:
+        ref = store_ref('customers')
+        updates = {}
+        for customer_id, customer in (ref.get() or {}).items():
+            for field, value in _customer_search_fields(customer).items():
+                if customer.get(field) != value:
+                    updates[f'{customer_id}/{field}'] = value
+        if updates:
+            ref.update(updates)
+    except Exception:
+        # Release the flag so a later search can retry the backfill
+        flag_ref.delete()
+        raise
+    _customer_search_backfilled.add(store_id)
+
+
 @app.route('/api/customers', methods=['GET'])
 @require_store_access
 def get_customers():
-    """Get all customers"""
+    """Get all customers, or those whose name starts with ?search= or whose phone starts or ends with it
+    
+    Each of the three cases is an indexed prefix query (phone endings via
+    phone_reversed); every customer is only scanned if those queries fail.
+    """
     try:
         search = request.args.get('search', '').lower()
         
         if not firebase_initialized:
+            if not search:
+                return json_response(DEMO_CUSTOMERS_JSON)
             customers = DEMO_CUSTOMERS
-        else:
-            ref = db.reference(f'stores/{request.store_id}/customers')
-            customers = ref.get() or {}
+            candidates = _trigram_candidates(DEMO_CUSTOMER_TRIGRAMS, search)
+            if candidates is not None:
+                customers = {k: DEMO_CUSTOMERS[k] for k in candidates}
+            return ojson({'customers': _filter_customers(customers, search)})
         
-        if search:
-            customers = {
-                k: v for k, v in customers.items() 
-                if search in v.get('name', '').lower() or search in v.get('phone', '')
-            }
+        ref = store_ref('customers')
+        if not search:
+            return ojson({'customers': ref.get() or {}})
+        
+        try:
+            _backfill_customer_search_fields(request.store_id)
+        except Exception as e:
+            logger.warning("Customer search field backfill failed: %s", e)
         
-        return jsonify({'customers': customers})
+        try:
+            # Prefix queries on the indexed fields, run together
+            futures = [
+                _io_pool.submit(
+                    ref.order_by_child(field).start_at(value).end_at(value + '\uf8ff')
+                    .limit_to_first(CUSTOMER_SEARCH_LIMIT).get
+                )
+                for field, value in (('name_lower', search), ('phone', search), ('phone_reversed', search[::-1]))
+            ]
+            customers = {}
+            for future in futures:
+                customers.update(future.result() or {})
+        except Exception as e:
+            logger.warning("Indexed customer search failed, scanning instead: %s", e)
+            customers = _filter_customers(ref.get() or {}, search)
+        
+        return ojson({'customers': customers})
     except Exception as e:
-        logger.error(f"Customers fetch error: {e}")
-        return jsonify({'error': str(e), 'code': 'FETCH_FAILED'}), 500
+        logger.error("Customers fetch error: %s", e)
+        return ojson({'error': str(e), 'code': 'FETCH_FAILED'}), 500
 
 
 @app.route('/api/customers', methods=['POST'])
@@ -597,10 +1315,10 @@ def create_customer():
     phone = data.get('phone')
     
     if not phone:
-        return jsonify({'error': 'Phone number required', 'code': 'MISSING_PHONE'}), 400
+        return ojson({'error': 'Phone number required', 'code': 'MISSING_PHONE'}), 400
     
     try:
-        customer_id = str(uuid.uuid4())
+        customer_id = _short_id()
         
         customer_data = {
             'id': customer_id,
@@ -610,23 +1328,28 @@ def create_customer():
             'points': int(data.get('points', 0)),
             'loyalty_tier': data.get('loyalty_tier', 'Bronze'),
             'notes': data.get('notes', ''),
-            'created_at': datetime.datetime.now().isoformat(),
+            'created_at': _now().iso,
             'total_purchases': 0
         }
+        customer_data.update(_customer_search_fields(customer_data))
         
         if firebase_initialized:
-            customer_ref = db.reference(f'stores/{request.store_id}/customers/{customer_id}')
+            customer_ref = store_ref(f'customers/{customer_id}')
             customer_ref.set(customer_data)
         
-        logger.info(f"Created customer {customer_id}")
-        return jsonify({'success': True, 'customer': customer_data})
+        logger.info("Created customer %s", customer_id)
+        return ojson({'success': True, 'customer': customer_data})
     except Exception as e:
-        logger.error(f"Customer creation error: {e}")
-        return jsonify({'error': str(e), 'code': 'CREATION_FAILED'}), 500
+        logger.error("Customer creation error: %s", e)
+        return ojson({'error': str(e), 'code': 'CREATION_FAILED'}), 500
 
 
 # ==================== ANALYTICS ====================
 
+# Sales analytics tolerate a few minutes of staleness
+SALES_ANALYTICS_CACHE_TTL = 300
+
+
 @app.route('/api/analytics/sales', methods=['GET'])
 @require_store_access
 def get_sales_analytics():
@@ -635,7 +1358,7 @@ def get_sales_analytics():
         days = int(request.args.get('days', 30))
         
         if not firebase_initialized:
-            return jsonify({
+            return ojson({
                 'period': f'Last {days} days',
                 'total_sales': 12543.67,
                 'total_transactions': 234,
@@ -644,32 +1367,94 @@ def get_sales_analytics():
                 'demo_mode': True
             })
         
-        ref = db.reference(f'stores/{request.store_id}/daily_summaries')
-        summaries = ref.get() or {}
-        
         # Filter by date range
-        from datetime import datetime, timedelta
-        cutoff = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime('%Y-%m-%d')
         
-        filtered_summaries = {k: v for k, v in summaries.items() if k >= cutoff}
+        # Summary keys are ISO dates, so history before the cutoff never leaves Firebase
+        cache_key = f'sales:{request.store_id}:{cutoff}'
+        analytics = _cache_get(cache_key)
         
-        total_sales = sum(s.get('total_sales', 0) for s in filtered_summaries.values())
-        total_transactions = sum(s.get('transaction_count', 0) for s in filtered_summaries.values())
-        
-        avg_daily = total_sales / len(filtered_summaries) if filtered_summaries else 0
-        avg_transaction = total_sales / total_transactions if total_transactions > 0 else 0
+        if analytics is None:
+            ref = store_ref('daily_summaries')
+            filtered_summaries = ref.order_by_key().start_at(cutoff).get() or {}
+            
+            total_sales = sum(s.get('total_sales', 0) for s in filtered_summaries.values())
+            total_transactions = sum(s.get('transaction_count', 0) for s in filtered_summaries.values())
+            
+            avg_daily = total_sales / len(filtered_summaries) if filtered_summaries else 0
+            avg_transaction = total_sales / total_transactions if total_transactions > 0 else 0
+            
+            analytics = {
+                'period': f'Last {days} days',
+                'total_sales': round(total_sales, 2),
+                'total_transactions': total_transactions,
+                'average_daily_sales': round(avg_daily, 2),
+                'average_transaction_value': round(avg_transaction, 2),
+                'daily_breakdown': filtered_summaries
+            }
+            _cache_set(cache_key, analytics, SALES_ANALYTICS_CACHE_TTL)
         
-        return jsonify({
-            'period': f'Last {days} days',
-            'total_sales': round(total_sales, 2),
-            'total_transactions': total_transactions,
-            'average_daily_sales': round(avg_daily, 2),
-            'average_transaction_value': round(avg_transaction, 2),
-            'daily_breakdown': filtered_summaries
-        })
+        return ojson(analytics)
     except Exception as e:
-        logger.error(f"Analytics error: {e}")
-        return jsonify({'error': str(e), 'code': 'ANALYTICS_FAILED'}), 500
+        logger.error("Analytics error: %s", e)
+        return ojson({'error': str(e), 'code': 'ANALYTICS_FAILED'}), 500
+
+
+TOP_PRODUCTS_CACHE_TTL = 60
+
+
+class ProductSalesAlreadyBackfilled(Exception):
+    """Raised inside the backfill-flag transaction when another request already claimed it"""
+
+
+def _backfill_product_sales():
+    """Add sales recorded before the running product totals existed, once per store
+    
+    Only transactions without the in_product_sales marker are tallied, and they
+    are added as server-side increments so live sales aren't overwritten.
+    Returns the totals that were added, or None if the backfill was already claimed.
+    """
+    flag_ref = store_ref('aggregates/product_sales_backfilled_at')
+    
+    def claim(current):
+        if current:
+            raise ProductSalesAlreadyBackfilled()
+        return _now().iso
+    
+    try:
+        flag_ref.transaction(claim)
+    except ProductSalesAlreadyBackfilled:
+        return None
+    
+    try:
+        transactions = store_ref('transactions').get() or {}
+        history = _tally_product_sales({
+            k: tx for k, tx in transactions.items() if not tx.get('in_product_sales')
+        })
+        updates = {}
+        for product_id, sales in history.items():
+            if sales['name']:
+                updates[f'{product_id}/name'] = sales['name']
+            updates[f'{product_id}/quantity_sold'] = _increment(sales['quantity_sold'])
+            updates[f'{product_id}/revenue'] = _increment(sales['revenue'])
+        if updates:
+            store_ref('aggregates/product_sales').update(updates)
+    except Exception:
+        # Release the flag so a later request can retry the backfill
+        flag_ref.delete()
+        raise
+    return history
+
+
+def _merge_product_sales(live, history):
+    """Per-product totals from two tallies added together"""
+    merged = {k: dict(v) for k, v in live.items()}
+    for product_id, sales in history.items():
+        totals = merged.setdefault(product_id, {'name': None, 'quantity_sold': 0, 'revenue': 0})
+        totals['name'] = totals.get('name') or sales['name']
+        totals['quantity_sold'] = totals.get('quantity_sold', 0) + sales['quantity_sold']
+        totals['revenue'] = totals.get('revenue', 0) + sales['revenue']
+    return merged
 
 
 @app.route('/api/analytics/top-products', methods=['GET'])
@@ -680,149 +1465,158 @@ def get_top_products():
         limit = int(request.args.get('limit', 10))
         
         if not firebase_initialized:
-            return jsonify({
-                'top_products': [
-                    {'name': 'Matte Ruby Lipstick', 'quantity_sold': 145, 'revenue': 3623.55},
-                    {'name': 'Naked Palette Eyeshadow', 'quantity_sold': 89, 'revenue': 4894.11},
-                    {'name': 'Silk Foundation - Beige', 'quantity_sold': 67, 'revenue': 2879.33},
-                    {'name': 'Hydrating Face Serum', 'quantity_sold': 45, 'revenue': 3104.55},
-                    {'name': 'Velvet Rose Lipstick', 'quantity_sold': 98, 'revenue': 2645.02}
-                ],
-                'demo_mode': True
-            })
-        
-        ref = db.reference(f'stores/{request.store_id}/transactions')
-        transactions = ref.get() or {}
+            return json_response(DEMO_TOP_PRODUCTS_JSON)
         
-        product_sales = {}
-        for tx in transactions.values():
-            for item in tx.get('items', []):
-                product_id = item.get('id')
-                quantity = item.get('quantity', 1)
-                
-                if product_id not in product_sales:
-                    product_sales[product_id] = {
-                        'name': item.get('name', 'Unknown'),
-                        'quantity_sold': 0,
-                        'revenue': 0
-                    }
-                
-                product_sales[product_id]['quantity_sold'] += quantity
-                product_sales[product_id]['revenue'] += item.get('price', 0) * quantity
+        cache_key = f'top_products:{request.store_id}:{limit}'
+        sorted_products = _cache_get(cache_key)
         
-        sorted_products = sorted(product_sales.values(), key=lambda x: x['revenue'], reverse=True)[:limit]
+        if sorted_products is None:
+            aggregates = store_ref('aggregates').get() or {}
+            product_sales = aggregates.get('product_sales') or {}
+            
+            if not aggregates.get('product_sales_backfilled_at'):
+                # Stores with sales from before the running totals existed: fold them in once
+                history = _backfill_product_sales()
+                if history:
+                    product_sales = _merge_product_sales(product_sales, history)
+            
+            sorted_products = [
+                {**p, 'name': p.get('name') or 'Unknown', 'revenue': round(p.get('revenue', 0), 2)}
+                for p in sorted(product_sales.values(), key=lambda x: x.get('revenue', 0), reverse=True)[:limit]
+            ]
+            _cache_set(cache_key, sorted_products, TOP_PRODUCTS_CACHE_TTL)
         
-        return jsonify({'top_products': sorted_products})
+        return ojson({'top_products': sorted_products})
     except Exception as e:
-        logger.error(f"Top products error: {e}")
-        return jsonify({'error': str(e), 'code': 'FETCH_FAILED'}), 500
+        logger.error("Top products error: %s", e)
+        return ojson({'error': str(e), 'code': 'FETCH_FAILED'}), 500
 
 
 # ==================== STORE CONFIG ====================
 
 @app.route('/api/store/config', methods=['GET'])
 @require_store_access
+@cached_store_response('config')
 def get_store_config():
     """Get store configuration"""
     try:
         if not firebase_initialized:
-            return jsonify({
-                'config': {
-                    'name': 'Velvet Beauty Boutique',
-                    'currency': 'USD',
-                    'currency_symbol': '$',
-                    'tax_rate': 0.08,
-                    'theme_color': '#D4AF37',
-                    'logo_url': '',
-                    'timezone': 'America/New_York',
-                    'demo_mode': True
-                }
-            })
+            return json_response(DEMO_STORE_CONFIG_JSON)
         
-        ref = db.reference(f'stores/{request.store_id}/config')
+        ref = store_ref('config')
         config = ref.get() or {}
-        return jsonify({'config': config})
+        return ojson({'config': config})
     except Exception as e:
-        logger.error(f"Config fetch error: {e}")
-        return jsonify({'error': str(e), 'code': 'FETCH_FAILED'}), 500
+        logger.error("Config fetch error: %s", e)
+        return ojson({'error': str(e), 'code': 'FETCH_FAILED'}), 500
 
 
 @app.route('/api/store/config', methods=['PUT'])
-@require_store_access
+@require_token
 @require_admin
+@require_store_user
 def update_store_config():
     """Update store configuration (Owner only)"""
     data = request.get_json()
     
     try:
         if not firebase_initialized:
-            return jsonify({'success': True, 'config': data, 'demo_mode': True})
+            return ojson({'success': True, 'config': data, 'demo_mode': True})
         
-        ref = db.reference(f'stores/{request.store_id}/config')
+        ref = store_ref('config')
         current_config = ref.get() or {}
         
         config = {**current_config, **data}
         ref.set(config)
+        _cache_delete(f'config:{request.store_id}')
         
-        logger.info(f"Updated store configuration")
-        return jsonify({'success': True, 'config': config})
+        logger.info("Updated store configuration")
+        return ojson({'success': True, 'config': config})
     except Exception as e:
-        logger.error(f"Config update error: {e}")
-        return jsonify({'error': str(e), 'code': 'UPDATE_FAILED'}), 500
+        logger.error("Config update error: %s", e)
+        return ojson({'error': str(e), 'code': 'UPDATE_FAILED'}), 500
 
 
 # ==================== CATEGORIES ====================
 
 @app.route('/api/categories', methods=['GET'])
 @require_store_access
+@cached_store_response('categories')
 def get_categories():
     """Get all categories"""
     try:
         if not firebase_initialized:
-            return jsonify({'categories': DEMO_CATEGORIES})
+            return json_response(DEMO_CATEGORIES_JSON)
         
-        ref = db.reference(f'stores/{request.store_id}/categories')
+        ref = store_ref('categories')
         categories = ref.get() or {}
-        return jsonify({'categories': categories})
+        return ojson({'categories': categories})
     except Exception as e:
-        logger.error(f"Categories fetch error: {e}")
-        return jsonify({'error': str(e), 'code': 'FETCH_FAILED'}), 500
+        logger.error("Categories fetch error: %s", e)
+        return ojson({'error': str(e), 'code': 'FETCH_FAILED'}), 500
 
 
 # ==================== STAFF ====================
 
+# Encoded staff lists per store. Roles change rarely, so a short in-process
+# TTL is enough; user writes drop the entry straight away.
+STAFF_CACHE_TTL = 30
+_STAFF_ROLES = frozenset(('staff', 'admin', 'manager', 'owner'))
+_staff_cache = TTLCache(maxsize=256, ttl=STAFF_CACHE_TTL)
+_staff_cache_lock = threading.Lock()
+
+
+def _invalidate_staff(store_id):
+    """Forget the cached staff list for a store"""
+    with _staff_cache_lock:
+        _staff_cache.pop(store_id, None)
+
+
+def _staff_response(body):
+    """Staff list response the browser revalidates by ETag on every load"""
+    response = json_response(body)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.add_etag(weak=True)
+    return response.make_conditional(request)
+
+
 @app.route('/api/staff', methods=['GET'])
-@require_store_access
+@require_token
 @require_admin
+@require_store_user
 def get_staff():
     """Get all staff members"""
     try:
         if not firebase_initialized:
-            return jsonify({
-                'staff': {
-                    'demo_user_1': {
-                        'email': 'admin@velvet.com',
-                        'name': 'Admin User',
-                        'role': 'owner',
-                        'active': True
-                    },
-                    'demo_user_2': {
-                        'email': 'staff@velvet.com',
-                        'name': 'Staff Member',
-                        'role': 'staff',
-                        'active': True
-                    }
-                }
-            })
+            return _staff_response(DEMO_STAFF_JSON)
+        
+        with _staff_cache_lock:
+            body = _staff_cache.get(request.store_id)
+        if body is not None:
+            return _staff_response(body)
+        
+        ref = store_ref('users')
         
-        ref = db.reference(f'stores/{request.store_id}/users')
-        users = ref.get() or {}
+        try:
+            # One indexed query per role, run together, so only staff records are downloaded.
+            # Sorted so every worker merges them in the same order and agrees on the ETag.
+            futures = [_io_pool.submit(ref.order_by_child('role').equal_to(role).get) for role in sorted(_STAFF_ROLES)]
+            staff = {}
+            for future in futures:
+                staff.update(future.result() or {})
+        except Exception as e:
+            logger.warning("Indexed staff query failed, scanning instead: %s", e)
+            users = ref.get() or {}
+            staff = {k: v for k, v in users.items() if v.get('role') in _STAFF_ROLES}
         
-        staff = {k: v for k, v in users.items() if v.get('role') in ['staff', 'admin', 'manager', 'owner']}
-        return jsonify({'staff': staff})
+        body = orjson.dumps({'staff': staff})
+        with _staff_cache_lock:
+            _staff_cache[request.store_id] = body
+        return _staff_response(body)
     except Exception as e:
-        logger.error(f"Staff fetch error: {e}")
-        return jsonify({'error': str(e), 'code': 'FETCH_FAILED'}), 500
+        logger.error("Staff fetch error: %s", e)
+        return ojson({'error': str(e), 'code': 'FETCH_FAILED'}), 500
 
 
 # ==================== DEMO DATA ====================
@@ -901,8 +1695,128 @@ DEMO_TRANSACTIONS = {
 }
 
 
+# Lookup tables over the demo data, so demo-mode searches don't scan every record
+
+def _trigrams(text):
+    """Lower-cased three-character substrings of text"""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _trigram_candidates(index, search):
+    """Ids that contain every trigram of search, or None if search is too short to use the index"""
+    grams = _trigrams(search)
+    if not grams:
+        return None
+    return set.intersection(*(index.get(gram, set()) for gram in grams))
+
+
+def _reindex_demo_inventory():
+    """Rebuild the id list and SKU, barcode and category indexes after DEMO_INVENTORY changes"""
+    global DEMO_PRODUCT_IDS, SKU_INDEX, BARCODE_INDEX, INVENTORY_BY_CATEGORY
+    DEMO_PRODUCT_IDS = tuple(DEMO_INVENTORY)
+    SKU_INDEX = {p['sku']: pid for pid, p in DEMO_INVENTORY.items() if p.get('sku')}
+    BARCODE_INDEX = {p['barcode']: pid for pid, p in DEMO_INVENTORY.items() if p.get('barcode')}
+    INVENTORY_BY_CATEGORY = defaultdict(list)
+    for pid, p in DEMO_INVENTORY.items():
+        INVENTORY_BY_CATEGORY[p.get('category')].append(pid)
+
+
+def get_products_by_category(category):
+    """Ids of the demo products in a category"""
+    return INVENTORY_BY_CATEGORY.get(category, [])
+
+
+DEMO_CATEGORY_IDS = tuple(DEMO_CATEGORIES)
+DEMO_PRODUCT_IDS = ()
+SKU_INDEX = {}
+BARCODE_INDEX = {}
+INVENTORY_BY_CATEGORY = {}
+_reindex_demo_inventory()
+
+DEMO_CUSTOMER_TRIGRAMS = defaultdict(set)
+for _customer_id, _customer in DEMO_CUSTOMERS.items():
+    for _gram in _trigrams(_customer.get('name', '')) | _trigrams(_customer.get('phone', '')):
+        DEMO_CUSTOMER_TRIGRAMS[_gram].add(_customer_id)
+
+DEMO_STORE_CONFIG = {
+    'name': 'Velvet Beauty Boutique',
+    'currency': 'USD',
+    'currency_symbol': '$',
+    'tax_rate': 0.08,
+    'theme_color': '#D4AF37',
+    'logo_url': '',
+    'timezone': 'America/New_York'
+}
+
+DEMO_TOP_PRODUCTS = [
+    {'name': 'Matte Ruby Lipstick', 'quantity_sold': 145, 'revenue': 3623.55},
+    {'name': 'Naked Palette Eyeshadow', 'quantity_sold': 89, 'revenue': 4894.11},
+    {'name': 'Silk Foundation - Beige', 'quantity_sold': 67, 'revenue': 2879.33},
+    {'name': 'Hydrating Face Serum', 'quantity_sold': 45, 'revenue': 3104.55},
+    {'name': 'Velvet Rose Lipstick', 'quantity_sold': 98, 'revenue': 2645.02}
+]
+
+DEMO_STAFF = {
+    'demo_user_1': {
+        'email': 'admin@velvet.com',
+        'name': 'Admin User',
+        'role': 'owner',
+        'active': True
+    },
+    'demo_user_2': {
+        'email': 'staff@velvet.com',
+        'name': 'Staff Member',
+        'role': 'staff',
+        'active': True
+    }
+}
+
+# Demo responses that never change, encoded once at import
+DEMO_STORE_CONFIG_JSON = orjson.dumps({'config': {**DEMO_STORE_CONFIG, 'demo_mode': True}})
+DEMO_TOP_PRODUCTS_JSON = orjson.dumps({'top_products': DEMO_TOP_PRODUCTS, 'demo_mode': True})
+DEMO_STAFF_JSON = orjson.dumps({'staff': DEMO_STAFF})
+DEMO_CATEGORIES_JSON = orjson.dumps({'categories': DEMO_CATEGORIES})
+DEMO_CUSTOMERS_JSON = orjson.dumps({'customers': DEMO_CUSTOMERS})
+DEMO_TRANSACTIONS_JSON = orjson.dumps({'transactions': DEMO_TRANSACTIONS})
+
+
 # ==================== INITIALIZATION ====================
 
+class DemoAlreadyInitialized(Exception):
+    """Raised inside the init-flag transaction when the store was already seeded"""
+    def __init__(self, initialized_at):
+        super().__init__(f'Demo data already initialized at {initialized_at}')
+        self.initialized_at = initialized_at
+
+
+def _claim_demo_init(flag_ref):
+    """Atomically set the store's init flag, aborting if another call already set it"""
+    def claim(current):
+        if current:
+            raise DemoAlreadyInitialized(current)
+        return _now().iso
+    return flag_ref.transaction(claim)
+
+
+def _seed_demo_store(store_id):
+    """Write the demo categories, inventory and config to a store"""
+    seed = {
+        'categories': DEMO_CATEGORIES,
+        'inventory': DEMO_INVENTORY,
+        'config': DEMO_STORE_CONFIG
+    }
+    try:
+        # One multi-location update replaces all three nodes in a single atomic request
+        _ref(store_id).update(seed)
+    except Exception as e:
+        # e.g. rules that refuse writes at the store root; set each node instead, all at once
+        logger.warning("Multi-path demo seed failed, writing nodes separately: %s", e)
+        futures = [_io_pool.submit(_ref(store_id, node).set, value) for node, value in seed.items()]
+        for future in futures:
+            future.result()
+
+
 @app.route('/api/demo/initialize', methods=['POST'])
 def initialize_demo():
     """Initialize demo store with sample data"""
@@ -910,42 +1824,77 @@ def initialize_demo():
         store_id = 'default'
         
         if firebase_initialized:
-            db.reference(f'stores/{store_id}/categories').set(DEMO_CATEGORIES)
-            db.reference(f'stores/{store_id}/inventory').set(DEMO_INVENTORY)
-            db.reference(f'stores/{store_id}/config').set({
-                'name': 'Velvet Beauty Boutique',
-                'currency': 'USD',
-                'currency_symbol': '$',
-                'tax_rate': 0.08,
-                'theme_color': '#D4AF37',
-                'logo_url': '',
-                'timezone': 'America/New_York'
-            })
+            store = _ref(store_id)
+            flag_ref = store.child('_initialized')
+            try:
+                _claim_demo_init(flag_ref)
+            except DemoAlreadyInitialized as e:
+                return ojson({
+                    'success': True,
+                    'message': 'Demo data already initialized',
+                    'initialized_at': e.initialized_at,
+                    'categories': list(DEMO_CATEGORY_IDS),
+                    'products': list(DEMO_PRODUCT_IDS)
+                })
+            
+            try:
+                _seed_demo_store(store_id)
+            except Exception:
+                # Release the flag so a later call can retry the seed
+                flag_ref.delete()
+                raise
+            _invalidate_inventory(store_id)
+            _cache_delete(f'config:{store_id}', f'categories:{store_id}')
         
         logger.info("Demo data initialized successfully")
-        return jsonify({
+        return ojson({
             'success': True,
             'message': 'Demo data initialized',
-            'categories': list(DEMO_CATEGORIES.keys()),
-            'products': list(DEMO_INVENTORY.keys())
+            'categories': list(DEMO_CATEGORY_IDS),
+            'products': list(DEMO_PRODUCT_IDS)
         })
     except Exception as e:
-        logger.error(f"Demo initialization error: {e}")
-        return jsonify({'error': str(e), 'code': 'INIT_FAILED'}), 500
+        logger.error("Demo initialization error: %s", e)
+        return ojson({'error': str(e), 'code': 'INIT_FAILED'}), 500
 
 
 # ==================== STATIC FILES ====================
 
+# Browser cache lifetime for client assets when Flask serves them (nginx does in production).
+# File names aren't content-hashed, so assets are revalidated by ETag after this.
+STATIC_MAX_AGE = 86400
+
+
 @app.route('/client/<path:path>')
 def serve_static(path):
     """Serve static files from client directory"""
-    return send_from_directory('../client', path)
+    return send_from_directory('../client', path, max_age=STATIC_MAX_AGE)
+
+
+def _load_favicon():
+    """Read the favicon once at boot, with its ETag, or (None, None) if there isn't one"""
+    try:
+        with open(os.path.join(app.root_path, '..', 'client', 'favicon.ico'), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None, None
+    return data, hashlib.sha1(data).hexdigest()
+
+
+_FAVICON_BYTES, _FAVICON_ETAG = _load_favicon()
+FAVICON_MAX_AGE = 604800
 
 
 @app.route('/favicon.ico')
 def favicon():
     """Serve favicon"""
-    return send_from_directory('../client', 'favicon.ico')
+    if _FAVICON_BYTES is None:
+        return '', 404
+    response = app.response_class(_FAVICON_BYTES, mimetype='image/x-icon')
+    response.set_etag(_FAVICON_ETAG)
+    response.cache_control.public = True
+    response.cache_control.max_age = FAVICON_MAX_AGE
+    return response.make_conditional(request)
 
 
 # ==================== MAIN ====================
@@ -953,8 +1902,24 @@ def favicon():
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     
-    logger.info(f"Starting VelvetPOS server on port {port}")
-    logger.info(f"Environment: {ENV}")
-    logger.info(f"Firebase: {'Connected' if firebase_initialized else 'Demo Mode'}")
+    logger.info("Starting VelvetPOS server on port %s", port)
+    logger.info("Environment: %s", ENV)
+    logger.info("Firebase: %s", 'Connected' if firebase_initialized else 'Demo Mode')
     
-    app.run(host='0.0.0.0', port=port, debug=DEBUG_MODE)
+    if DEBUG_MODE:
+        app.run(host='0.0.0.0', port=port, debug=True)
+    else:
+        # Outside development, hand the process over to gunicorn with gevent workers
+        # so requests keep being served while others wait on Firebase.
+        # exec skips atexit, so drain the log queue first or the lines above are lost.
+        _log_listener.stop()
+        os.execvp('gunicorn', [
+            'gunicorn',
+            '--chdir', os.path.dirname(os.path.abspath(__file__)),
+            '--bind', f'0.0.0.0:{port}',
+            '--worker-class', 'gevent',
+            '--workers', os.environ.get('WEB_CONCURRENCY', '4'),
+            '--worker-connections', str(WORKER_CONNECTIONS),
+            '--timeout', '120',
+            'app:app'
+        ])